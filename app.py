@@ -67,12 +67,15 @@ with st.sidebar:
     st.caption("有価証券報告書・財務データビューア")
     st.divider()
     st.markdown("### クイック検索")
-    quick_search = st.text_input(
-        "証券コード or 企業名",
-        placeholder="例: 7203, トヨタ",
-        key="sidebar_search",
-    )
-    if quick_search:
+    # Enter / ボタンで送信したときだけ検索する（1文字ごとに検索しない）
+    with st.form("sidebar_search_form", clear_on_submit=False):
+        quick_search = st.text_input(
+            "証券コード or 企業名",
+            placeholder="例: 7203, トヨタ",
+            key="sidebar_search",
+        )
+        submitted = st.form_submit_button("検索")
+    if submitted and quick_search:
         results = db.search_companies(quick_search)
         if not results.empty:
             for _, row in results.head(10).iterrows():
@@ -138,22 +141,9 @@ st.markdown("### 最近の提出書類")
 recent = db.get_recent_documents(limit=30)
 
 if not recent.empty:
-    # 書類種別名を追加
-    recent["書類種別"] = recent["doc_type_code"].map(
-        lambda x: db.DOC_TYPE_NAMES.get(x, x)
-    )
-    # 表示用に整形
-    display_cols = {
-        "file_date": "提出日",
-        "sec_code": "コード",
-        "filer_name": "企業名",
-        "書類種別": "書類種別",
-        "doc_description": "概要",
-        "period_end": "期末",
-    }
-    df_display = recent[list(display_cols.keys())].rename(columns=display_cols)
+    # 列名・書類種別名は SQL 側で表示用に整形済み
     st.dataframe(
-        df_display,
+        recent,
         hide_index=True,
         use_container_width=True,
         column_config={
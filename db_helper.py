@@ -6,92 +6,167 @@ SQLite データベースからデータを取得し、Streamlit の
 @st.cache_data でキャッシュして返すユーティリティ群。
 """
 
+import json
+import queue
 import sqlite3
 import pandas as pd
 import streamlit as st
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 # ── DB パス ──────────────────────────────────────────
 
 DB_PATH = Path(__file__).parent / "data" / "edinet_data.sqlite3"
 
 
+POOL_SIZE = 4
+
+# 全接続に一度だけ適用する PRAGMA（query_only は TEMP ビュー作成後に有効化）
+_PRAGMAS = (
+    "PRAGMA cache_size = -65536",      # 64 MiB
+    "PRAGMA mmap_size = 268435456",    # 256 MiB
+    "PRAGMA temp_store = MEMORY",      # 変更すると既存の TEMP オブジェクトは消える
+)
+
+
 def get_connection() -> sqlite3.Connection:
-    """SQLite 接続を取得（読み取り専用）"""
+    """SQLite 接続を生成（読み取り専用、PRAGMA 適用済み）"""
     if not DB_PATH.exists():
         st.error(f"データベースが見つかりません: {DB_PATH}")
         st.stop()
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    # 読み取り専用 + 共有キャッシュ（プール内の接続でページキャッシュを共有）
+    conn = sqlite3.connect(
+        f"{DB_PATH.resolve().as_uri()}?mode=ro&cache=shared",
+        uri=True,
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    # 表示用ビューは接続ごとの TEMP ビューにする（DB ファイルには書き込まない）
+    try:
+        conn.execute(
+            f"CREATE TEMP VIEW IF NOT EXISTS v_recent_docs AS {_recent_docs_sql()}"
+        )
+    except sqlite3.OperationalError:
+        pass  # documents が無い DB など
+    conn.execute("PRAGMA query_only = 1")  # mode=ro に加えて念のため
     return conn
 
 
-def _query_df(sql: str, params: tuple = ()) -> pd.DataFrame:
-    """SQL を実行して DataFrame で返す"""
-    conn = get_connection()
+# 部分一致検索用の全文検索テーブル（companies_fts / text_blocks_fts）は
+# migrate_db.py --fts で作成する。無い DB では LIKE 検索で動作する。
+# trigram で検索できるキーワードの最小文字数（これより短い場合も LIKE）
+FTS_MIN_CHARS = 3
+
+
+def _fts_match(table: str, keyword: str) -> Optional[str]:
+    """FTS が使えればキーワードを MATCH 用のフレーズにして返す"""
+    if len(keyword) < FTS_MIN_CHARS or table not in _schema():
+        return None
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+@st.cache_resource
+def _pool() -> queue.Queue:
+    """使い回す接続のプール（プロセス内で1つ）"""
+    pool = queue.Queue(maxsize=POOL_SIZE)
+    for _ in range(POOL_SIZE):
+        pool.put(get_connection())
+    return pool
+
+
+@contextmanager
+def _checkout() -> Iterator[sqlite3.Connection]:
+    """プールから接続を借りて、使い終わったら返す"""
+    pool = _pool()
+    conn = pool.get()
     try:
-        df = pd.read_sql_query(sql, conn, params=params)
-        return df
+        yield conn
     finally:
-        conn.close()
+        pool.put(conn)
+
+
+def _query_df(
+    sql: str,
+    params: tuple = (),
+    dtype_backend: Optional[str] = None,
+    dtype: Optional[dict] = None,
+) -> pd.DataFrame:
+    """SQL を実行して DataFrame で返す
+
+    文字列主体の大きな結果は dtype_backend="pyarrow" で Arrow 型のまま読む。
+    dtype で列の型を固定すると、全件 NULL の列も object にならない。
+    """
+    kwargs = {}
+    if dtype_backend:
+        kwargs["dtype_backend"] = dtype_backend
+    if dtype:
+        kwargs["dtype"] = dtype
+    with _checkout() as conn:
+        return pd.read_sql_query(sql, conn, params=params, **kwargs)
 
 
 # ── 統計情報 ─────────────────────────────────────────
 
+@st.cache_resource
+def _schema() -> dict[str, frozenset[str]]:
+    """テーブル/ビュー名 → カラム名の集合（DB によって有無が異なるため一度だけ調べる）"""
+    with _checkout() as conn:
+        names = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') "
+            "UNION ALL "
+            "SELECT name FROM sqlite_temp_master WHERE type = 'view'"
+        )]
+        return {
+            name: frozenset(
+                r[1] for r in conn.execute(f'PRAGMA table_info("{name}")')
+            )
+            for name in names
+        }
+
+
+def _count_expr(*tables: str) -> str:
+    """最初に存在するテーブルの件数を返すスカラーサブクエリ（無ければ 0）"""
+    schema = _schema()
+    for table in tables:
+        if table in schema:
+            return f"(SELECT COUNT(*) FROM {table})"
+    return "0"
+
+
 @st.cache_data(ttl=3600)
 def get_db_stats() -> dict:
     """データベースの統計情報を取得"""
-    conn = get_connection()
-    try:
-        stats = {}
-        # 書類数
-        stats["total_docs"] = conn.execute(
-            "SELECT COUNT(*) FROM documents"
-        ).fetchone()[0]
-        # 企業数（ユニークな証券コード）
-        stats["total_companies"] = conn.execute(
-            "SELECT COUNT(DISTINCT sec_code) FROM documents WHERE sec_code IS NOT NULL AND sec_code != ''"
-        ).fetchone()[0]
-        # 解析済み
-        try:
-            stats["parsed_docs"] = conn.execute(
-                "SELECT COUNT(*) FROM documents WHERE parse_status = 1"
-            ).fetchone()[0]
-        except Exception:
-            stats["parsed_docs"] = 0
-        # DL 済み
-        try:
-            stats["downloaded_docs"] = conn.execute(
-                "SELECT COUNT(*) FROM documents WHERE dl_status > 0"
-            ).fetchone()[0]
-        except Exception:
-            stats["downloaded_docs"] = 0
-        # 財務レコード数（key_financials テーブル or financials テーブル）
-        try:
-            stats["financial_records"] = conn.execute(
-                "SELECT COUNT(*) FROM key_financials"
-            ).fetchone()[0]
-        except Exception:
-            try:
-                stats["financial_records"] = conn.execute(
-                    "SELECT COUNT(*) FROM financials"
-                ).fetchone()[0]
-            except Exception:
-                stats["financial_records"] = 0
-        # テキストブロック数
-        try:
-            stats["text_blocks"] = conn.execute(
-                "SELECT COUNT(*) FROM text_blocks"
-            ).fetchone()[0]
-        except Exception:
-            stats["text_blocks"] = 0
-        # 期間
-        row = conn.execute(
-            "SELECT MIN(file_date) as min_date, MAX(file_date) as max_date FROM documents"
-        ).fetchone()
-        stats["date_from"] = row[0] or ""
-        stats["date_to"] = row[1] or ""
+    doc_cols = _schema().get("documents", frozenset())
+    # 最小DBには parse_status / dl_status が無いことがある
+    parsed = "SUM(parse_status = 1)" if "parse_status" in doc_cols else "0"
+    downloaded = "SUM(dl_status > 0)" if "dl_status" in doc_cols else "0"
+
+    with _checkout() as conn:
+        # documents を1回走査して集計し、企業数・他テーブルの件数も同じクエリで取る
+        row = conn.execute(f"""
+            SELECT
+                COUNT(*) AS total_docs,
+                (
+                    SELECT COUNT(*) FROM (
+                        SELECT 1 FROM documents
+                        WHERE sec_code IS NOT NULL AND sec_code != ''
+                        GROUP BY sec_code
+                    )
+                ) AS total_companies,
+                {parsed} AS parsed_docs,
+                {downloaded} AS downloaded_docs,
+                {_count_expr("key_financials", "financials")} AS financial_records,
+                {_count_expr("text_blocks")} AS text_blocks,
+                MIN(file_date) AS date_from,
+                MAX(file_date) AS date_to
+            FROM documents
+        """).fetchone()
+        stats = {k: row[k] or 0 for k in row.keys()}
+        stats["date_from"] = row["date_from"] or ""
+        stats["date_to"] = row["date_to"] or ""
         # 書類種別ごとの件数
         rows = conn.execute("""
             SELECT doc_type_code, COUNT(*) as cnt FROM documents
@@ -99,34 +174,75 @@ def get_db_stats() -> dict:
         """).fetchall()
         stats["doc_type_counts"] = {r[0]: r[1] for r in rows}
         return stats
-    finally:
-        conn.close()
 
 
 # ── 企業一覧・検索 ──────────────────────────────────
 
-@st.cache_data(ttl=3600)
-def get_company_list() -> pd.DataFrame:
-    """全企業の証券コード + 名前リストを取得"""
-    return _query_df("""
-        SELECT DISTINCT
-            sec_code,
-            filer_name,
-            COUNT(*) as doc_count,
-            MAX(file_date) as latest_date
-        FROM documents
-        WHERE sec_code IS NOT NULL AND sec_code != ''
-        GROUP BY sec_code, filer_name
-        ORDER BY sec_code
-    """)
+_COMPANY_LIST_SQL = """
+    SELECT DISTINCT
+        sec_code,
+        filer_name,
+        COUNT(*) as doc_count,
+        MAX(file_date) as latest_date
+    FROM documents
+    WHERE sec_code IS NOT NULL AND sec_code != ''
+    GROUP BY sec_code, filer_name
+    ORDER BY sec_code
+"""
 
 
+@st.cache_data(ttl=6 * 3600, show_spinner=False)
+def get_company_list() -> pd.DataFrame:
+    """全企業の証券コード + 名前リストを取得"""
+    return _query_df(_COMPANY_LIST_SQL)
+
+
+@st.cache_data(ttl=6 * 3600, show_spinner=False)
+def get_company_index() -> pd.Series:
+    """証券コード → 企業名 の Series（社名変更があれば最新の名前）"""
+    companies = get_company_list().sort_values(["sec_code", "latest_date"])
+    return (
+        companies.drop_duplicates("sec_code", keep="last")
+        .set_index("sec_code")["filer_name"]
+    )
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_company_count() -> int:
+    """企業一覧の件数（get_company_list の行数）を取得"""
+    with _checkout() as conn:
+        return conn.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM documents
+                WHERE sec_code IS NOT NULL AND sec_code != ''
+                GROUP BY sec_code, filer_name
+            )
+        """).fetchone()[0]
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_company_list_page(offset: int, limit: int) -> pd.DataFrame:
+    """企業一覧の1ページ分を取得（LIMIT/OFFSET を SQL 側で適用）"""
+    return _query_df(
+        _COMPANY_LIST_SQL + "LIMIT ? OFFSET ?",
+        (limit, offset),
+    )
+
+
+@st.cache_data(ttl=300, show_spinner=False)
 def search_companies(keyword: str) -> pd.DataFrame:
     """企業名 or 証券コードで部分一致検索"""
     if not keyword.strip():
         return pd.DataFrame()
-    like = f"%{keyword.strip()}%"
-    return _query_df("""
+    keyword = keyword.strip()
+    match = _fts_match("companies_fts", keyword)
+    if match:
+        condition = "rowid IN (SELECT rowid FROM companies_fts WHERE companies_fts MATCH ?)"
+        params = (match,)
+    else:
+        condition = "(sec_code LIKE ? OR filer_name LIKE ?)"
+        params = (f"%{keyword}%", f"%{keyword}%")
+    return _query_df(f"""
         SELECT DISTINCT
             sec_code,
             filer_name,
@@ -134,10 +250,10 @@ def search_companies(keyword: str) -> pd.DataFrame:
             MAX(file_date) as latest_date
         FROM documents
         WHERE sec_code IS NOT NULL AND sec_code != ''
-          AND (sec_code LIKE ? OR filer_name LIKE ?)
+          AND {condition}
         GROUP BY sec_code, filer_name
         ORDER BY sec_code
-    """, (like, like))
+    """, params)
 
 
 # ── 企業詳細 ────────────────────────────────────────
@@ -153,7 +269,11 @@ DOC_TYPE_NAMES = {
     "070": "訂正大量保有報告書",
 }
 
+# Series.map 用（dict を毎回 Series 化しないよう一度だけ作る）
+DOC_TYPE_NAME_SERIES = pd.Series(DOC_TYPE_NAMES)
+
 
+@st.cache_data(ttl=600, show_spinner=False)
 def get_company_documents(sec_code: str) -> pd.DataFrame:
     """指定企業の書類一覧を取得"""
     return _query_df("""
@@ -166,13 +286,27 @@ def get_company_documents(sec_code: str) -> pd.DataFrame:
     """, (sec_code,))
 
 
+# v_key_financials から各ページが実際に使う列
+KEY_FIN_COLUMNS = (
+    "sec_code", "filer_name", "period_end", "is_consolidated",
+    "sales", "operating_income", "ordinary_income", "net_income",
+    "total_assets", "net_assets",
+    "operating_cf", "investing_cf", "financing_cf",
+)
+_KEY_FIN_SELECT = ", ".join(KEY_FIN_COLUMNS)
+# 金額列は常に float64（NULL だけの列が object になり、表示時の
+# Arrow 変換で要素ごとの型推論が走るのを防ぐ）
+_KEY_FIN_DTYPES = {c: "float64" for c in KEY_FIN_COLUMNS[4:]}
+
+
+@st.cache_data(ttl=600, show_spinner=False)
 def get_key_financials(sec_code: str) -> pd.DataFrame:
     """企業の主要財務指標を期別に取得（v_key_financials ビュー使用）"""
-    return _query_df("""
-        SELECT * FROM v_key_financials
+    return _query_df(f"""
+        SELECT {_KEY_FIN_SELECT} FROM v_key_financials
         WHERE sec_code = ?
         ORDER BY period_end DESC
-    """, (sec_code,))
+    """, (sec_code,), dtype=_KEY_FIN_DTYPES)
 
 
 def get_financial_details(sec_code: str, is_consolidated: int = 1) -> pd.DataFrame:
@@ -193,24 +327,59 @@ def get_financial_details(sec_code: str, is_consolidated: int = 1) -> pd.DataFra
         return pd.DataFrame()
 
 
-def get_company_text_blocks(sec_code: str) -> pd.DataFrame:
-    """企業のテキストブロックを取得"""
-    return _query_df("""
+# 企業詳細ページで表示するテキストの最大文字数（切り詰めは SQLite 側で行う）
+TEXT_PREVIEW_CHARS = 10000
+
+# テキストブロックの本文を unsafe_allow_html で埋め込むときの HTML エスケープ表
+# （本文をそのまま埋め込むとタグが解釈されるので、表示する全ページで使う）
+HTML_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def get_company_text_periods(sec_code: str) -> list[str]:
+    """企業のテキストブロックがある期末の一覧（新しい順）"""
+    with _checkout() as conn:
+        rows = conn.execute("""
+            SELECT DISTINCT period_end
+            FROM text_blocks
+            WHERE sec_code = ? AND period_end IS NOT NULL
+            ORDER BY period_end DESC
+        """, (sec_code,)).fetchall()
+        return [r[0] for r in rows]
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def get_company_text_blocks(
+    sec_code: str, period_end: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    企業のテキストブロックを取得（企業詳細ページで使う列のみ）。
+    本文は先頭 TEXT_PREVIEW_CHARS 文字の preview と全長 full_len で返す。
+    """
+    conditions = ["sec_code = ?"]
+    params = [sec_code]
+    if period_end:
+        conditions.append("period_end = ?")
+        params.append(period_end)
+
+    where = " AND ".join(conditions)
+
+    return _query_df(f"""
         SELECT
-            doc_id, sec_code, filer_name,
-            period_start, period_end,
-            element_name, section_label, context,
-            text_content
+            doc_id, period_end,
+            element_name, section_label,
+            substr(text_content, 1, {TEXT_PREVIEW_CHARS}) AS preview,
+            length(text_content) AS full_len
         FROM text_blocks
-        WHERE sec_code = ?
+        WHERE {where}
         ORDER BY period_end DESC, element_name
-    """, (sec_code,))
+    """, tuple(params), dtype_backend="pyarrow")
 
 
+@st.cache_data(ttl=600, show_spinner=False)
 def get_company_info(sec_code: str) -> dict:
     """企業の基本情報を取得"""
-    conn = get_connection()
-    try:
+    with _checkout() as conn:
         row = conn.execute("""
             SELECT
                 sec_code, filer_name,
@@ -224,54 +393,75 @@ def get_company_info(sec_code: str) -> dict:
         if row:
             return dict(row)
         return {}
-    finally:
-        conn.close()
 
 
 # ── 企業比較 ────────────────────────────────────────
 
-def get_multi_company_financials(sec_codes: list[str]) -> pd.DataFrame:
-    """複数企業の主要財務指標を取得"""
+@st.cache_data(ttl=600, max_entries=32, show_spinner=False)
+def get_multi_company_financials(sec_codes: tuple[str, ...]) -> pd.DataFrame:
+    """複数企業の主要財務指標を取得（キャッシュキーにするため tuple で渡す）"""
     if not sec_codes:
         return pd.DataFrame()
-    placeholders = ",".join("?" * len(sec_codes))
+    # 件数によらず同じ SQL になるよう、コードは JSON 配列1つで渡す
     return _query_df(f"""
-        SELECT * FROM v_key_financials
-        WHERE sec_code IN ({placeholders})
+        SELECT {_KEY_FIN_SELECT} FROM v_key_financials
+        WHERE sec_code IN (SELECT value FROM json_each(?))
         ORDER BY sec_code, period_end DESC
-    """, tuple(sec_codes))
+    """, (json.dumps(list(sec_codes)),), dtype=_KEY_FIN_DTYPES)
 
 
 # ── スクリーニング ──────────────────────────────────
 
+# ウィンドウ関数は SQLite 3.25 以降
+_HAS_WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+
+@st.cache_data(ttl=900, show_spinner=False)
 def get_screening_data() -> pd.DataFrame:
     """
     スクリーニング用に全企業の最新期の主要財務指標を取得。
-    各企業の最新の期末データのみを返す。
+    各企業の最新の期末データのみを返す（同一期末が複数あれば売上高のある行、
+    次に訂正報告書を優先）。
     """
-    return _query_df("""
+    if _HAS_WINDOW_FUNCTIONS:
+        return _query_df(f"""
+            SELECT {_KEY_FIN_SELECT} FROM (
+                SELECT
+                    v.*,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY sec_code
+                        ORDER BY period_end DESC, sales IS NULL, doc_type_code DESC
+                    ) AS rn
+                FROM v_key_financials v
+                WHERE v.is_consolidated = 1
+            )
+            WHERE rn = 1
+            ORDER BY sec_code
+        """, dtype=_KEY_FIN_DTYPES)
+    v_columns = ", ".join(f"v.{c}" for c in KEY_FIN_COLUMNS)
+    return _query_df(f"""
         WITH latest AS (
             SELECT sec_code, MAX(period_end) as max_period
             FROM v_key_financials
             WHERE is_consolidated = 1
             GROUP BY sec_code
         )
-        SELECT v.*
+        SELECT {v_columns}
         FROM v_key_financials v
         INNER JOIN latest l
             ON v.sec_code = l.sec_code
             AND v.period_end = l.max_period
         WHERE v.is_consolidated = 1
         ORDER BY v.sec_code
-    """)
+    """, dtype=_KEY_FIN_DTYPES)
 
 
 # ── テキストブロック ────────────────────────────────
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def get_text_block_sections() -> list[str]:
     """利用可能なテキストブロックセクション名のリストを取得"""
-    conn = get_connection()
-    try:
+    with _checkout() as conn:
         rows = conn.execute("""
             SELECT DISTINCT section_label
             FROM text_blocks
@@ -279,8 +469,18 @@ def get_text_block_sections() -> list[str]:
             ORDER BY section_label
         """).fetchall()
         return [r[0] for r in rows]
-    finally:
-        conn.close()
+
+
+# FTS の highlight() で一致箇所を囲む目印（本文に現れない制御文字。表示側で
+# HTML エスケープしてから <mark> に置き換える）
+HIGHLIGHT_OPEN = "\x02"
+HIGHLIGHT_CLOSE = "\x03"
+
+_TEXT_BLOCK_COLUMNS = """
+            t.id, t.doc_id, t.sec_code, t.filer_name,
+            t.period_start, t.period_end,
+            t.element_name, t.section_label,
+            length(t.text_content) AS full_len"""
 
 
 def search_text_blocks(
@@ -289,52 +489,122 @@ def search_text_blocks(
     keyword: Optional[str] = None,
     period_end: Optional[str] = None,
     limit: int = 50,
+    preview_chars: int = TEXT_PREVIEW_CHARS,
 ) -> pd.DataFrame:
-    """テキストブロックを検索"""
+    """
+    テキストブロックを検索（本文が大きいので文字列列は Arrow で保持）。
+    本文は先頭 preview_chars 文字の preview と全長 full_len で返し、全文は
+    get_text_block_texts() で id を指定して取得する。
+    FTS で検索できたときは preview を highlight() の結果にして一致箇所を
+    HIGHLIGHT_OPEN / HIGHLIGHT_CLOSE で囲み、marked を 1 にする。
+    """
     conditions = ["1=1"]
     params = []
+    match = None
 
     if sec_code:
-        conditions.append("sec_code = ?")
+        conditions.append("t.sec_code = ?")
         params.append(sec_code)
     if section_label:
-        conditions.append("section_label = ?")
+        conditions.append("t.section_label = ?")
         params.append(section_label)
     if keyword:
-        conditions.append("text_content LIKE ?")
-        params.append(f"%{keyword}%")
+        match = _fts_match("text_blocks_fts", keyword)
+        if match:
+            conditions.append("text_blocks_fts MATCH ?")
+            params.append(match)
+        else:
+            conditions.append("t.text_content LIKE ?")
+            params.append(f"%{keyword}%")
     if period_end:
-        conditions.append("period_end = ?")
+        conditions.append("t.period_end = ?")
         params.append(period_end)
 
     where = " AND ".join(conditions)
 
+    if not match:
+        return _query_df(f"""
+            SELECT {_TEXT_BLOCK_COLUMNS},
+                substr(t.text_content, 1, ?) AS preview, 0 AS marked
+            FROM text_blocks t
+            WHERE {where}
+            ORDER BY t.period_end DESC, t.sec_code
+            LIMIT ?
+        """, (preview_chars,) + tuple(params) + (limit,),
+            dtype_backend="pyarrow")
+
+    # 目印の分だけ多めに切る（一致箇所は FTS_MIN_CHARS 文字以上で、1か所ごとに
+    # 目印が2文字増えるので、この長さなら本文を preview_chars 文字は必ず含む）
+    marked_chars = preview_chars + preview_chars * 2 // FTS_MIN_CHARS
+
+    # 表示する行を先に LIMIT で決め、その行だけ highlight() を計算する
+    # （CROSS JOIN で結合順を固定し、FTS は rowid 指定で1行ずつ引く）
     return _query_df(f"""
-        SELECT
-            doc_id, sec_code, filer_name,
-            period_start, period_end,
-            element_name, section_label,
-            text_content
+        WITH hits AS (
+            SELECT t.id
+            FROM text_blocks t
+            JOIN text_blocks_fts ON text_blocks_fts.rowid = t.id
+            WHERE {where}
+            ORDER BY t.period_end DESC, t.sec_code
+            LIMIT ?
+        )
+        SELECT {_TEXT_BLOCK_COLUMNS},
+            substr(highlight(text_blocks_fts, 0, char(2), char(3)), 1, ?)
+                AS preview,
+            1 AS marked
+        FROM hits
+        CROSS JOIN text_blocks_fts
+        CROSS JOIN text_blocks t
+        WHERE text_blocks_fts.rowid = hits.id
+            AND text_blocks_fts MATCH ?
+            AND t.id = hits.id
+        ORDER BY t.period_end DESC, t.sec_code
+    """, tuple(params) + (limit, marked_chars, match), dtype_backend="pyarrow")
+
+
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def get_text_block_texts(ids: tuple[int, ...]) -> pd.DataFrame:
+    """テキストブロックの全文を id で取得（ダウンロード用。id, text_content）"""
+    if not ids:
+        return pd.DataFrame(columns=["id", "text_content"])
+    marks = ", ".join("?" * len(ids))
+    return _query_df(f"""
+        SELECT id, text_content
         FROM text_blocks
-        WHERE {where}
-        ORDER BY period_end DESC, sec_code
-        LIMIT ?
-    """, tuple(params) + (limit,))
+        WHERE id IN ({marks})
+    """, tuple(ids), dtype_backend="pyarrow")
 
 
 # ── 最近の提出書類 ──────────────────────────────────
 
-@st.cache_data(ttl=600)
-def get_recent_documents(limit: int = 30) -> pd.DataFrame:
-    """最近提出された書類リストを取得"""
-    return _query_df("""
+def _recent_docs_sql() -> str:
+    """最近の提出書類を表示用の列名・書類種別名で返す SELECT（v_recent_docs の定義）"""
+    cases = "\n".join(
+        f"            WHEN '{code}' THEN '{name}'"
+        for code, name in DOC_TYPE_NAMES.items()
+    )
+    return f"""
         SELECT
-            doc_id, sec_code, filer_name,
-            doc_type_code, doc_description,
-            period_start, period_end,
-            submit_date, file_date
+            file_date AS "提出日",
+            sec_code AS "コード",
+            filer_name AS "企業名",
+            CASE doc_type_code
+{cases}
+            ELSE doc_type_code END AS "書類種別",
+            doc_description AS "概要",
+            period_end AS "期末"
         FROM documents
         WHERE sec_code IS NOT NULL AND sec_code != ''
         ORDER BY file_date DESC, submit_date DESC
-        LIMIT ?
-    """, (limit,))
+    """
+
+
+@st.cache_data(ttl=600)
+def get_recent_documents(limit: int = 30) -> pd.DataFrame:
+    """最近提出された書類リストを表示用の形で取得"""
+    if "v_recent_docs" in _schema():
+        source = "v_recent_docs"
+    else:
+        # ビューを作れなかった接続では同じ SELECT を直接使う
+        source = f"({_recent_docs_sql()})"
+    return _query_df(f"SELECT * FROM {source} LIMIT ?", (limit,))
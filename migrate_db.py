@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+EDINET Viewer — DB マイグレーション
+
+閲覧用のインデックスを既存の DB に追加する。アプリ本体は DB を
+読み取り専用で開くので、データ取り込み後にこのスクリプトを一度実行する。
+
+    python migrate_db.py [DBファイルのパス] [--fts]
+
+--fts を付けると部分一致検索用の全文検索テーブル（FTS5 trigram）も作り直す。
+DB ファイルがおよそ倍の大きさになるので、リポジトリで管理する DB には
+使わないこと。同期トリガーは作らない（取り込み側の SQLite に FTS5 を
+要求しないため）。取り込みのたびに --fts 付きで再実行して再構築する。
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+DEFAULT_DB_PATH = Path(__file__).parent / "data" / "edinet_data.sqlite3"
+
+# 閲覧クエリ用のインデックス
+INDEXES = (
+    # 企業数カウント・企業一覧用（空コードを除いた部分インデックス）
+    """CREATE INDEX IF NOT EXISTS idx_documents_seccode ON documents(sec_code)
+       WHERE sec_code IS NOT NULL AND sec_code != ''""",
+    # 最近の提出書類用（ORDER BY と WHERE に一致する降順の部分インデックス）
+    """CREATE INDEX IF NOT EXISTS idx_documents_recent
+       ON documents(file_date DESC, submit_date DESC)
+       WHERE sec_code IS NOT NULL AND sec_code != ''""",
+    # 企業別テキストブロック用
+    "CREATE INDEX IF NOT EXISTS idx_text_blocks_sec_period "
+    "ON text_blocks(sec_code, period_end)",
+)
+
+# 全文検索テーブル名 → (元テーブル, rowid 列, 検索対象列)
+# 外部コンテンツ方式で元テーブルを参照する（trigram は SQLite 3.34 以降）
+FTS_TABLES = {
+    "companies_fts": (
+        "documents", "rowid", ("sec_code", "filer_name"),
+    ),
+    "text_blocks_fts": (
+        "text_blocks", "id", ("text_content",),
+    ),
+}
+
+
+def _build_fts(conn: sqlite3.Connection) -> None:
+    """全文検索テーブルを作成して元テーブルの内容で構築し直す"""
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+    for name, (source, rowid, columns) in FTS_TABLES.items():
+        if source not in existing:
+            continue
+        cols = ", ".join(columns)
+        conn.execute("BEGIN")
+        try:
+            conn.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(
+                {cols}, content='{source}', content_rowid='{rowid}',
+                tokenize='trigram'
+            )""")
+            conn.execute(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def migrate(db_path: Path, fts: bool = False) -> None:
+    """インデックス（と指定があれば全文検索テーブル）を作成"""
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        if fts:
+            _build_fts(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--fts"]
+    path = Path(args[0]) if args else DEFAULT_DB_PATH
+    if not path.exists():
+        sys.exit(f"データベースが見つかりません: {path}")
+    migrate(path, fts="--fts" in sys.argv[1:])
+    print(f"完了: {path}")
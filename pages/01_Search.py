@@ -39,43 +39,31 @@ if keyword or search_clicked:
         if not results.empty:
             st.success(f"{len(results)} 件の企業が見つかりました")
 
-            # 表示用に整形
+            # 表示用に整形（詳細・テキストページへのリンク列を付与）
             display_df = results.rename(columns={
                 "sec_code": "証券コード",
                 "filer_name": "企業名",
                 "doc_count": "書類数",
                 "latest_date": "最終提出日",
             })
-
-            # 各行にリンクを追加
-            for _, row in results.iterrows():
-                sec = row["sec_code"]
-                name = row["filer_name"]
-                count = row["doc_count"]
-                latest = row["latest_date"]
-
-                col1, col2, col3, col4 = st.columns([1, 3, 1, 2])
-                with col1:
-                    st.code(sec)
-                with col2:
-                    st.markdown(f"**{name}**")
-                with col3:
-                    st.caption(f"{count} 件")
-                with col4:
-                    cols = st.columns(3)
-                    with cols[0]:
-                        st.link_button(
-                            "詳細",
-                            f"/Company?sec_code={sec}",
-                            use_container_width=True,
-                        )
-                    with cols[1]:
-                        st.link_button(
-                            "テキスト",
-                            f"/TextBlocks?sec_code={sec}",
-                            use_container_width=True,
-                        )
-                st.divider()
+            display_df["詳細"] = "/Company?sec_code=" + results["sec_code"]
+            display_df["テキスト"] = "/TextBlocks?sec_code=" + results["sec_code"]
+
+            st.dataframe(
+                display_df,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "証券コード": st.column_config.TextColumn(width="small"),
+                    "書類数": st.column_config.NumberColumn(width="small"),
+                    "詳細": st.column_config.LinkColumn(
+                        display_text="詳細", width="small",
+                    ),
+                    "テキスト": st.column_config.LinkColumn(
+                        display_text="テキスト", width="small",
+                    ),
+                },
+            )
         else:
             st.warning("該当する企業が見つかりませんでした。")
     else:
@@ -84,20 +72,18 @@ if keyword or search_clicked:
 # ── 全企業一覧 ────────────────────────────────────────
 
 with st.expander("全企業一覧を表示", expanded=False):
-    all_companies = db.get_company_list()
-    if not all_companies.empty:
-        st.caption(f"全 {len(all_companies)} 企業")
+    total_companies = db.get_company_count()
+    if total_companies:
+        st.caption(f"全 {total_companies} 企業")
 
         # ページネーション
         page_size = 50
-        total_pages = max(1, (len(all_companies) - 1) // page_size + 1)
+        total_pages = max(1, (total_companies - 1) // page_size + 1)
         page = st.number_input(
             "ページ", min_value=1, max_value=total_pages, value=1, key="company_page"
         )
-        start = (page - 1) * page_size
-        end = start + page_size
 
-        page_df = all_companies.iloc[start:end]
+        page_df = db.get_company_list_page((page - 1) * page_size, page_size)
         display_df = page_df.rename(columns={
             "sec_code": "証券コード",
             "filer_name": "企業名",
@@ -5,6 +5,8 @@ URLパラメータ ?sec_code=XXXXX で企業を指定し、
 財務テーブル・チャート・テキストブロックを表示する。
 """
 
+import codecs
+import io
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
@@ -17,41 +19,44 @@ st.set_page_config(
     layout="wide",
 )
 
+# ── CSV 生成 ──────────────────────────────────────────
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _financials_csv(sec_code: str, consol: int, _display: pd.DataFrame) -> bytes:
+    """財務テーブルの CSV（BOM 付き UTF-8）。(sec_code, consol) をキーにキャッシュ"""
+    buf = io.BytesIO()
+    buf.write(codecs.BOM_UTF8)
+    _display.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
+
+
 # ── 企業選択 ──────────────────────────────────────────
 
 # URLパラメータから取得
 params = st.query_params
 sec_code_param = params.get("sec_code", "")
 
-# 企業選択 UI
 st.title("企業詳細")
 
-company_list = db.get_company_list()
-if company_list.empty:
-    st.warning("企業データがまだありません。")
+# URL で指定されていなければ検索して選ぶ（全企業リストは送らない）
+with st.expander("企業を検索", expanded=not sec_code_param):
+    company_keyword = st.text_input(
+        "証券コード or 企業名",
+        placeholder="例: 7203, トヨタ",
+        key="company_search",
+    )
+    if company_keyword:
+        candidates = db.search_companies(company_keyword).head(10)
+        if candidates.empty:
+            st.info("該当企業が見つかりません")
+        for sec, name in zip(candidates["sec_code"], candidates["filer_name"]):
+            st.link_button(f"{sec} {name}", f"/Company?sec_code={sec}")
+
+if not sec_code_param:
+    st.info("企業を検索して選択してください。")
     st.stop()
 
-# 選択肢を作成
-options = {
-    f"{row['sec_code']} - {row['filer_name']}": row["sec_code"]
-    for _, row in company_list.iterrows()
-}
-
-# デフォルト選択
-default_idx = 0
-if sec_code_param:
-    for i, (label, code) in enumerate(options.items()):
-        if code == sec_code_param:
-            default_idx = i
-            break
-
-selected_label = st.selectbox(
-    "企業を選択",
-    list(options.keys()),
-    index=default_idx,
-    key="company_select",
-)
-sec_code = options[selected_label]
+sec_code = sec_code_param
 
 # ── 企業情報ヘッダー ──────────────────────────────────
 
@@ -70,6 +75,9 @@ with col3:
 
 st.divider()
 
+# 財務データ・チャート両タブで共用
+key_fin = db.get_key_financials(sec_code)
+
 # ── タブ構成 ──────────────────────────────────────────
 
 tab_fin, tab_chart, tab_text, tab_docs = st.tabs([
@@ -81,8 +89,6 @@ tab_fin, tab_chart, tab_text, tab_docs = st.tabs([
 with tab_fin:
     st.markdown("### 主要財務指標")
 
-    key_fin = db.get_key_financials(sec_code)
-
     if not key_fin.empty:
         # 連結/単体の選択
         consol_options = key_fin["is_consolidated"].unique()
@@ -97,6 +103,7 @@ with tab_fin:
             )
             fin_df = key_fin[key_fin["is_consolidated"] == consol].copy()
         else:
+            consol = consol_options[0]
             fin_df = key_fin.copy()
 
         # 表示用に整形（金額を億円に変換）
@@ -109,11 +116,10 @@ with tab_fin:
         yen_cols = ["sales", "operating_income", "ordinary_income", "net_income",
                     "total_assets", "net_assets",
                     "operating_cf", "investing_cf", "financing_cf"]
-        for col in yen_cols:
-            if col in display.columns:
-                display[col] = display[col].apply(
-                    lambda x: round(x / 1e8, 1) if pd.notna(x) else None
-                )
+        yen_cols_present = [c for c in yen_cols if c in display.columns]
+        display[yen_cols_present] = (
+            display[yen_cols_present].astype("float64") / 1e8
+        ).round(1)
 
         display = display.rename(columns={
             "period_end": "期末",
@@ -138,10 +144,9 @@ with tab_fin:
         )
 
         # CSV ダウンロード
-        csv = display.to_csv(index=False).encode("utf-8-sig")
         st.download_button(
             "CSV ダウンロード",
-            csv,
+            _financials_csv(sec_code, int(consol), display),
             file_name=f"{sec_code}_financials.csv",
             mime="text/csv",
         )
@@ -153,8 +158,6 @@ with tab_fin:
 with tab_chart:
     st.markdown("### 財務推移チャート")
 
-    key_fin = db.get_key_financials(sec_code)
-
     if not key_fin.empty:
         # 連結のみでフィルタ（存在すれば）
         if 1 in key_fin["is_consolidated"].values:
@@ -165,11 +168,11 @@ with tab_chart:
         chart_df = chart_df.sort_values("period_end")
 
         # 億円変換
-        for col in ["sales", "operating_income", "ordinary_income", "net_income",
-                     "total_assets", "net_assets",
-                     "operating_cf", "investing_cf", "financing_cf"]:
-            if col in chart_df.columns:
-                chart_df[col] = chart_df[col] / 1e8
+        chart_cols = [c for c in ["sales", "operating_income", "ordinary_income",
+                                  "net_income", "total_assets", "net_assets",
+                                  "operating_cf", "investing_cf", "financing_cf"]
+                      if c in chart_df.columns]
+        chart_df[chart_cols] = chart_df[chart_cols] / 1e8
 
         # ── 売上・利益チャート ──
         fig1 = make_subplots(specs=[[{"secondary_y": True}]])
@@ -261,25 +264,28 @@ with tab_chart:
 with tab_text:
     st.markdown("### テキストブロック（事業の状況等）")
 
-    text_blocks = db.get_company_text_blocks(sec_code)
+    periods = db.get_company_text_periods(sec_code)
 
-    if not text_blocks.empty:
-        # 期で選択
-        periods = sorted(text_blocks["period_end"].unique(), reverse=True)
+    if periods:
+        # 期で選択（本文は選択した期の分だけ取得）
         selected_period = st.selectbox(
             "期末を選択",
             periods,
             key="text_period",
         )
 
-        period_blocks = text_blocks[text_blocks["period_end"] == selected_period]
+        period_blocks = db.get_company_text_blocks(
+            sec_code, selected_period
+        ).fillna({"section_label": "", "preview": "", "full_len": 0})
 
         if not period_blocks.empty:
             st.caption(f"{len(period_blocks)} 件のテキストブロック")
 
             for _, block in period_blocks.iterrows():
                 section = block["section_label"] or block["element_name"]
-                content = block["text_content"] or ""
+                # 本文は HTML として埋め込むのでエスケープしておく
+                content = block["preview"].translate(db.HTML_ESCAPE)
+                full_len = block["full_len"]
 
                 with st.expander(f"**{section}**", expanded=False):
                     if content:
@@ -289,11 +295,14 @@ with tab_text:
                             f'font-size: 0.9em; line-height: 1.6; '
                             f'max-height: 500px; overflow-y: auto; '
                             f'padding: 10px; background: #fafafa; '
-                            f'border-radius: 8px;">{content[:10000]}</div>',
+                            f'border-radius: 8px;">{content}</div>',
                             unsafe_allow_html=True,
                         )
-                        if len(content) > 10000:
-                            st.caption(f"（テキスト全長: {len(content):,} 文字、先頭10,000文字を表示）")
+                        if full_len > db.TEXT_PREVIEW_CHARS:
+                            st.caption(
+                                f"（テキスト全長: {full_len:,} 文字、"
+                                f"先頭{db.TEXT_PREVIEW_CHARS:,}文字を表示）"
+                            )
                     else:
                         st.caption("テキストなし")
         else:
@@ -309,8 +318,9 @@ with tab_docs:
     docs = db.get_company_documents(sec_code)
 
     if not docs.empty:
-        docs["書類種別"] = docs["doc_type_code"].map(
-            lambda x: db.DOC_TYPE_NAMES.get(x, x)
+        docs["書類種別"] = (
+            docs["doc_type_code"].map(db.DOC_TYPE_NAME_SERIES)
+            .fillna(docs["doc_type_code"])
         )
 
         display_docs = docs[[
@@ -4,10 +4,13 @@
 最大5社を選択し、主要財務指標を横並びで比較する。
 """
 
+import numpy as np
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 import plotly.graph_objects as go
 import db_helper as db
+from typing import Optional
 
 st.set_page_config(
     page_title="企業比較 | EDINET Viewer",
@@ -15,24 +18,70 @@ st.set_page_config(
     layout="wide",
 )
 
+# 億円の数値を桁区切り・小数1桁の文字列にする（要素ごとに適用する ufunc）
+_fmt_oku = np.frompyfunc("{:,.1f}".format, 1, 1)
+
+# 推移チャートで選べる指標（表示名 → 列名）
+metric_col_map = {
+    "売上高": "sales",
+    "営業利益": "operating_income",
+    "経常利益": "ordinary_income",
+    "純利益": "net_income",
+    "総資産": "total_assets",
+    "純資産": "net_assets",
+    "営業CF": "operating_cf",
+    "投資CF": "investing_cf",
+    "財務CF": "financing_cf",
+}
+
+
+# ── チャート用データ ──────────────────────────────────
+
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def _company_series(
+    sec_code: str, consolidated_only: bool
+) -> Optional[tuple[np.ndarray, dict[str, np.ndarray], str]]:
+    """
+    1社分の (期末, {列名: 億円の値}, 企業名)。指標を切り替えても
+    並べ替え・億円変換をやり直さないよう、全指標分をまとめてキャッシュ。
+    """
+    fin = db.get_key_financials(sec_code)
+    if consolidated_only:
+        fin = fin[fin["is_consolidated"] == 1]
+    if fin.empty:
+        return None
+    fin = fin.sort_values("period_end")
+    values = {
+        col: fin[col].to_numpy(dtype=np.float64) / 1e8
+        for col in metric_col_map.values()
+    }
+    return fin["period_end"].to_numpy(), values, fin["filer_name"].iloc[0]
+
+
 st.title("企業比較")
 st.markdown("最大5社の財務データを横並びで比較できます。")
 
 # ── 企業選択 ──────────────────────────────────────────
 
-company_list = db.get_company_list()
-if company_list.empty:
-    st.warning("企業データがまだありません。")
-    st.stop()
+# 企業の選択肢はセッション中に変わらないので、初回だけ作って保持する
+if "compare_options" not in st.session_state:
+    company_index = db.get_company_index()
+    if company_index.empty:
+        st.warning("企業データがまだありません。")
+        st.stop()
 
-options = {
-    f"{row['sec_code']} - {row['filer_name']}": row["sec_code"]
-    for _, row in company_list.iterrows()
-}
+    # 列を ndarray で取り出して zip（行ごとの Series 生成なし）
+    codes = company_index.index.to_numpy()
+    names = company_index.to_numpy()
+    labels = tuple(f"{c} - {n}" for c, n in zip(codes, names))
+    st.session_state.compare_labels = labels
+    st.session_state.compare_options = dict(zip(labels, codes))
+
+options = st.session_state.compare_options
 
 selected_labels = st.multiselect(
     "比較する企業を選択（最大5社）",
-    list(options.keys()),
+    st.session_state.compare_labels,
     max_selections=5,
     key="compare_companies",
 )
@@ -45,31 +94,31 @@ selected_codes = [options[label] for label in selected_labels]
 
 # ── データ取得 ────────────────────────────────────────
 
-all_fin = db.get_multi_company_financials(selected_codes)
+all_fin = db.get_multi_company_financials(tuple(selected_codes))
 
 if all_fin.empty:
     st.warning("選択した企業の財務データがまだ解析されていません。")
     st.stop()
 
 # 連結のみフィルタ
-if 1 in all_fin["is_consolidated"].values:
+consolidated_only = bool((all_fin["is_consolidated"] == 1).any())
+if consolidated_only:
     all_fin = all_fin[all_fin["is_consolidated"] == 1]
 
 # ── 最新期の比較テーブル ──────────────────────────────
 
 st.markdown("### 最新期の比較")
 
-# 各企業の最新期データを取得
-latest_data = []
-for code in selected_codes:
-    company_fin = all_fin[all_fin["sec_code"] == code]
-    if not company_fin.empty:
-        latest = company_fin.sort_values("period_end", ascending=False).iloc[0]
-        latest_data.append(latest)
-
-if latest_data:
-    compare_df = pd.DataFrame(latest_data)
+# 各企業の最新期データを取得（1回の groupby で全社分、選択順に並べる）
+latest_df = (
+    all_fin.sort_values("period_end")
+    .groupby("sec_code", sort=False)
+    .tail(1)
+    .set_index("sec_code")
+)
+latest_df = latest_df.loc[[c for c in selected_codes if c in latest_df.index]]
 
+if not latest_df.empty:
     # 表示用に転置テーブルを作成
     metrics = {
         "企業名": "filer_name",
@@ -84,108 +133,106 @@ if latest_data:
         "投資CF（億円）": "investing_cf",
         "財務CF（億円）": "financing_cf",
     }
-
-    rows = []
-    for label, col in metrics.items():
-        row = {"指標": label}
-        for i, data in enumerate(latest_data):
-            company_name = data.get("filer_name", f"企業{i+1}")
-            val = data.get(col)
-            if col == "filer_name" or col == "period_end":
-                row[company_name] = val
-            elif pd.notna(val):
-                row[company_name] = f"{val / 1e8:,.1f}"
-            else:
-                row[company_name] = "-"
-        rows.append(row)
-
-    compare_display = pd.DataFrame(rows)
+    amount_cols = list(metrics.values())[2:]
+
+    # 億円変換と書式化は配列で一括（欠損は isnan 一回で "-" に置換）
+    amounts = latest_df[amount_cols].to_numpy(dtype=np.float64) / 1e8
+    amounts_str = np.where(np.isnan(amounts), "-", _fmt_oku(amounts))
+
+    # 行 = 指標、列 = 企業 の形で一度に組み立てる
+    body = np.vstack([
+        latest_df["filer_name"].to_numpy(dtype=object),
+        latest_df["period_end"].to_numpy(dtype=object),
+        amounts_str.T,
+    ])
+    compare_display = pd.DataFrame(
+        body,
+        index=pd.Index(list(metrics.keys()), name="指標"),
+        columns=latest_df["filer_name"].to_numpy(),
+    ).reset_index()
     st.dataframe(compare_display, hide_index=True, use_container_width=True)
 
 # ── 推移チャート（重ね表示） ──────────────────────────
 
 st.markdown("### 財務推移比較")
 
-chart_metric = st.selectbox(
-    "表示する指標",
-    ["売上高", "営業利益", "経常利益", "純利益", "総資産", "純資産",
-     "営業CF", "投資CF", "財務CF"],
-    key="compare_metric",
-)
+colors = ["#1a73e8", "#e53935", "#43a047", "#f9a825", "#7b1fa2"]
 
-metric_col_map = {
-    "売上高": "sales",
-    "営業利益": "operating_income",
-    "経常利益": "ordinary_income",
-    "純利益": "net_income",
-    "総資産": "total_assets",
-    "純資産": "net_assets",
-    "営業CF": "operating_cf",
-    "投資CF": "investing_cf",
-    "財務CF": "financing_cf",
-}
 
-col_name = metric_col_map[chart_metric]
+@st.fragment
+def _trend_chart(selected_codes: list, consolidated_only: bool) -> None:
+    """指標を切り替えてもこのチャートだけを再実行する"""
+    chart_metric = st.selectbox(
+        "表示する指標",
+        list(metric_col_map.keys()),
+        key="compare_metric",
+    )
+    col_name = metric_col_map[chart_metric]
+
+    # 指標ごとの配列はキャッシュ済み。選んだ列だけ取り出す
+    parts = [
+        (code, _company_series(code, consolidated_only)) for code in selected_codes
+    ]
+    parts = [
+        (f"{code} {series[2]}", series[0], series[1][col_name])
+        for code, series in parts if series is not None
+    ]
+    if not parts:
+        st.info("推移を表示できるデータがありません。")
+        return
+
+    # 全社分を縦に連結した long 形式にし、企業ごとの色分けは px に任せる
+    company_labels, periods, values = zip(*parts)
+    long = pd.DataFrame({
+        "期末": np.concatenate(periods),
+        chart_metric: np.concatenate(values),
+        "企業": np.repeat(company_labels, [len(p) for p in periods]),
+    })
+
+    fig = px.line(
+        long, x="期末", y=chart_metric, color="企業",
+        markers=True,
+        color_discrete_sequence=colors,
+        category_orders={"企業": list(company_labels)},
+    )
+    fig.update_traces(line=dict(width=3), marker=dict(size=8))
 
-colors = ["#1a73e8", "#e53935", "#43a047", "#f9a825", "#7b1fa2"]
+    fig.update_layout(
+        title=f"{chart_metric}推移比較（億円）",
+        xaxis_title="期末",
+        yaxis_title=f"{chart_metric}（億円）",
+        height=500,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, title_text=""),
+        margin=dict(t=80, b=40),
+    )
 
-fig = go.Figure()
-
-for i, code in enumerate(selected_codes):
-    company_fin = all_fin[all_fin["sec_code"] == code].sort_values("period_end")
-    if not company_fin.empty:
-        name = company_fin.iloc[0]["filer_name"]
-        values = company_fin[col_name] / 1e8  # 億円変換
-        fig.add_trace(go.Scatter(
-            x=company_fin["period_end"],
-            y=values,
-            name=f"{code} {name}",
-            mode="lines+markers",
-            line=dict(color=colors[i % len(colors)], width=3),
-            marker=dict(size=8),
-        ))
+    st.plotly_chart(fig, use_container_width=True)
 
-fig.update_layout(
-    title=f"{chart_metric}推移比較（億円）",
-    xaxis_title="期末",
-    yaxis_title=f"{chart_metric}（億円）",
-    height=500,
-    legend=dict(orientation="h", yanchor="bottom", y=1.02),
-    margin=dict(t=80, b=40),
-)
 
-st.plotly_chart(fig, use_container_width=True)
+_trend_chart(selected_codes, consolidated_only)
 
 # ── レーダーチャート ──────────────────────────────────
 
 st.markdown("### 財務指標レーダーチャート")
 st.caption("各企業の最新期データを正規化して比較します。")
 
-if latest_data and len(latest_data) >= 2:
+if len(latest_df) >= 2:
     radar_metrics = ["sales", "operating_income", "net_income",
                      "total_assets", "net_assets", "operating_cf"]
     radar_labels = ["売上高", "営業利益", "純利益", "総資産", "純資産", "営業CF"]
 
-    # 正規化（各指標の最大値で割る）
-    fig_radar = go.Figure()
+    # 正規化（各指標を企業間の絶対値の最大値で割る。欠損は 0）
+    values = np.nan_to_num(latest_df[radar_metrics].to_numpy(dtype=np.float64))
+    max_vals = np.abs(values).max(axis=0)
+    max_vals[max_vals == 0] = 1.0
+    normalized = values / max_vals
 
-    # 各指標の最大値を求める
-    max_vals = {}
-    for metric in radar_metrics:
-        vals = [abs(d.get(metric, 0) or 0) for d in latest_data]
-        max_vals[metric] = max(vals) if max(vals) > 0 else 1
-
-    for i, data in enumerate(latest_data):
-        name = f"{data.get('sec_code', '')} {data.get('filer_name', '')}"
-        values = []
-        for metric in radar_metrics:
-            val = data.get(metric, 0) or 0
-            normalized = val / max_vals[metric]
-            values.append(normalized)
-        values.append(values[0])  # 閉じる
+    fig_radar = go.Figure()
 
+    names = latest_df.index + " " + latest_df["filer_name"].to_numpy()
+    for i, name in enumerate(names):
         fig_radar.add_trace(go.Scatterpolar(
-            r=values,
+            r=np.concatenate([normalized[i], normalized[i, :1]]),  # 閉じる
             theta=radar_labels + [radar_labels[0]],
             fill="toself",
             name=name,
@@ -4,6 +4,7 @@
 売上高・利益・自己資本比率等の条件で企業を絞り込む。
 """
 
+import numpy as np
 import streamlit as st
 import pandas as pd
 import db_helper as db
@@ -14,35 +15,72 @@ st.set_page_config(
     layout="wide",
 )
 
+# ── データ準備 ────────────────────────────────────────
+
+# 表示・絞り込みに使う金額列（億円に換算して元の列を置き換える）
+YEN_COLS = ["sales", "operating_income", "net_income",
+            "total_assets", "net_assets"]
+
+
+# 検索結果の表示上限
+SCREENING_LIMIT = 1000
+
+
+@st.cache_data(ttl=900, show_spinner=False)
+def _screening_frame() -> pd.DataFrame:
+    """
+    最新期データを必要な列だけに絞り、金額を億円に換算して比率列を加える
+    （データ更新ごとに一度だけ計算）
+    """
+    df = db.get_screening_data()
+    if df.empty:
+        return df
+
+    amounts = df[YEN_COLS].to_numpy(dtype=np.float64)
+    net_assets = amounts[:, YEN_COLS.index("net_assets")]
+    total_assets = amounts[:, YEN_COLS.index("total_assets")]
+    operating_income = amounts[:, YEN_COLS.index("operating_income")]
+    sales = amounts[:, YEN_COLS.index("sales")]
+
+    # 証券コードは category、数値列は float32（表示・比較用なので十分）
+    out = pd.DataFrame({
+        "sec_code": df["sec_code"].astype("category"),
+        "filer_name": df["filer_name"],
+        "period_end": df["period_end"],
+    })
+    out[YEN_COLS] = (amounts / 1e8).astype(np.float32)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 自己資本比率 = 純資産 / 総資産 * 100
+        out["equity_ratio"] = (
+            net_assets / total_assets * 100
+        ).round(1).astype(np.float32)
+        # 営業利益率 = 営業利益 / 売上高 * 100
+        out["op_margin"] = (
+            operating_income / sales * 100
+        ).round(1).astype(np.float32)
+    return out
+
+
+# ── CSV 生成 ──────────────────────────────────────────
+
+@st.cache_data(ttl="5m", max_entries=32, show_spinner=False)
+def _screening_csv(key: tuple, _display: pd.DataFrame) -> bytes:
+    """検索結果の CSV（BOM 付き UTF-8）。フィルタ条件と並び順をキーにキャッシュ"""
+    return _display.to_csv(index=False).encode("utf-8-sig")
+
+
 st.title("スクリーニング")
 st.markdown("財務指標の条件で企業を絞り込みます。各企業の最新期データが対象です。")
 
 # ── データ取得 ────────────────────────────────────────
 
-screening_data = db.get_screening_data()
+screening_data = _screening_frame()
 
 if screening_data.empty:
     st.warning("スクリーニング用の財務データがまだありません。")
     st.stop()
 
-# 億円変換した列を追加
-yen_cols = ["sales", "operating_income", "ordinary_income", "net_income",
-            "total_assets", "net_assets",
-            "operating_cf", "investing_cf", "financing_cf"]
-for col in yen_cols:
-    if col in screening_data.columns:
-        screening_data[f"{col}_oku"] = screening_data[col] / 1e8
-
-# 自己資本比率 = 純資産 / 総資産 * 100
-screening_data["equity_ratio"] = (
-    screening_data["net_assets"] / screening_data["total_assets"] * 100
-).round(1)
-
-# 営業利益率 = 営業利益 / 売上高 * 100
-screening_data["op_margin"] = (
-    screening_data["operating_income"] / screening_data["sales"] * 100
-).round(1)
-
 st.caption(f"対象企業数: {len(screening_data):,} 社")
 
 # ── フィルタ条件 ──────────────────────────────────────
@@ -93,97 +131,77 @@ with col3:
 
 # ── フィルタ適用 ──────────────────────────────────────
 
-filtered = screening_data.copy()
-
-# 売上高
-if sales_min is not None:
-    filtered = filtered[filtered["sales_oku"] >= sales_min]
-if sales_max is not None:
-    filtered = filtered[filtered["sales_oku"] <= sales_max]
-
-# 営業利益
-if op_min is not None:
-    filtered = filtered[filtered["operating_income_oku"] >= op_min]
-if op_max is not None:
-    filtered = filtered[filtered["operating_income_oku"] <= op_max]
-
-# 純利益
-if ni_min is not None:
-    filtered = filtered[filtered["net_income_oku"] >= ni_min]
-if ni_max is not None:
-    filtered = filtered[filtered["net_income_oku"] <= ni_max]
-
-# 自己資本比率
-if eq_min is not None:
-    filtered = filtered[filtered["equity_ratio"] >= eq_min]
-if eq_max is not None:
-    filtered = filtered[filtered["equity_ratio"] <= eq_max]
-
-# 営業利益率
-if margin_min is not None:
-    filtered = filtered[filtered["op_margin"] >= margin_min]
-if margin_max is not None:
-    filtered = filtered[filtered["op_margin"] <= margin_max]
-
-# 総資産
-if ta_min is not None:
-    filtered = filtered[filtered["total_assets_oku"] >= ta_min]
-if ta_max is not None:
-    filtered = filtered[filtered["total_assets_oku"] <= ta_max]
+sort_col = st.selectbox(
+    "並び替え",
+    ["売上高（降順）", "営業利益（降順）", "純利益（降順）",
+     "自己資本比率（降順）", "営業利益率（降順）", "総資産（降順）"],
+    key="sort_option",
+)
+
+sort_map = {
+    "売上高（降順）": "sales",
+    "営業利益（降順）": "operating_income",
+    "純利益（降順）": "net_income",
+    "自己資本比率（降順）": "equity_ratio",
+    "営業利益率（降順）": "op_margin",
+    "総資産（降順）": "total_assets",
+}
+sort_key = sort_map.get(sort_col, "sales")
+
+# (列, 最小, 最大) の条件を1つのブールマスクにまとめて一度に絞り込む
+bounds = [
+    ("sales", sales_min, sales_max),                 # 売上高
+    ("operating_income", op_min, op_max),            # 営業利益
+    ("net_income", ni_min, ni_max),                  # 純利益
+    ("equity_ratio", eq_min, eq_max),                # 自己資本比率
+    ("op_margin", margin_min, margin_max),           # 営業利益率
+    ("total_assets", ta_min, ta_max),                # 総資産
+]
 
 # NaN を除外（フィルタ対象の指標が存在しない企業）
-filtered = filtered.dropna(subset=["sales"])
+mask = ~np.isnan(screening_data["sales"].to_numpy(dtype=np.float64))
+for col, lower, upper in bounds:
+    values = screening_data[col].to_numpy(dtype=np.float64)
+    if lower is not None:
+        mask &= values >= lower
+    if upper is not None:
+        mask &= values <= upper
+
+filtered = screening_data.loc[mask]
+match_count = len(filtered)
+
+# 並び替えて上位だけを表示
+filtered = filtered.sort_values(
+    sort_key, ascending=False, na_position="last"
+).head(SCREENING_LIMIT)
 
 # ── 結果表示 ──────────────────────────────────────────
 
 st.divider()
-st.markdown(f"### 検索結果: **{len(filtered):,}** 社")
+st.markdown(f"### 検索結果: **{match_count:,}** 社")
+if match_count > SCREENING_LIMIT:
+    st.caption(f"上位 {SCREENING_LIMIT:,} 社を表示しています。")
 
 if not filtered.empty:
-    # ソート
-    sort_col = st.selectbox(
-        "並び替え",
-        ["売上高（降順）", "営業利益（降順）", "純利益（降順）",
-         "自己資本比率（降順）", "営業利益率（降順）", "総資産（降順）"],
-        key="sort_option",
-    )
-
-    sort_map = {
-        "売上高（降順）": ("sales_oku", False),
-        "営業利益（降順）": ("operating_income_oku", False),
-        "純利益（降順）": ("net_income_oku", False),
-        "自己資本比率（降順）": ("equity_ratio", False),
-        "営業利益率（降順）": ("op_margin", False),
-        "総資産（降順）": ("total_assets_oku", False),
-    }
-
-    sort_key, sort_asc = sort_map.get(sort_col, ("sales_oku", False))
-    filtered = filtered.sort_values(sort_key, ascending=sort_asc, na_position="last")
-
-    # 表示用 DataFrame
-    display = filtered[[
-        "sec_code", "filer_name", "period_end",
-        "sales_oku", "operating_income_oku", "net_income_oku",
-        "total_assets_oku", "net_assets_oku",
-        "equity_ratio", "op_margin",
-    ]].rename(columns={
+    # 表示用 DataFrame（filtered は表示する列だけを持つので列名を変えるだけ。
+    # rename が新しいフレームを返すので、丸めはこちらにだけ効く）
+    display = filtered.rename(columns={
         "sec_code": "コード",
         "filer_name": "企業名",
         "period_end": "期末",
-        "sales_oku": "売上高(億円)",
-        "operating_income_oku": "営業利益(億円)",
-        "net_income_oku": "純利益(億円)",
-        "total_assets_oku": "総資産(億円)",
-        "net_assets_oku": "純資産(億円)",
+        "sales": "売上高(億円)",
+        "operating_income": "営業利益(億円)",
+        "net_income": "純利益(億円)",
+        "total_assets": "総資産(億円)",
+        "net_assets": "純資産(億円)",
         "equity_ratio": "自己資本比率(%)",
         "op_margin": "営業利益率(%)",
     })
 
     # 小数点整形
-    for col in ["売上高(億円)", "営業利益(億円)", "純利益(億円)",
-                "総資産(億円)", "純資産(億円)"]:
-        if col in display.columns:
-            display[col] = display[col].round(1)
+    amount_labels = ["売上高(億円)", "営業利益(億円)", "純利益(億円)",
+                     "総資産(億円)", "純資産(億円)"]
+    display[amount_labels] = display[amount_labels].round(1)
 
     st.dataframe(
         display,
@@ -193,14 +211,19 @@ if not filtered.empty:
         column_config={
             "コード": st.column_config.TextColumn(width="small"),
             "期末": st.column_config.TextColumn(width="small"),
+            # float32 の誤差桁を出さないよう小数1桁で表示
+            **{
+                col: st.column_config.NumberColumn(format="%.1f")
+                for col in display.columns[3:]
+            },
         },
     )
 
     # CSV ダウンロード
-    csv = display.to_csv(index=False).encode("utf-8-sig")
+    csv_key = (len(display), sort_col, tuple(bounds))
     st.download_button(
         "CSV ダウンロード",
-        csv,
+        _screening_csv(csv_key, display),
         file_name="screening_result.csv",
         mime="text/csv",
     )
@@ -4,7 +4,11 @@
 事業の状況、リスク、MD&A 等のテキストを閲覧・検索する。
 """
 
+import codecs
+import io
 import re
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import streamlit as st
 import pandas as pd
 import db_helper as db
@@ -15,6 +19,93 @@ st.set_page_config(
     layout="wide",
 )
 
+# キーワードハイライトのタグ
+HL_OPEN = (
+    '<mark style="background-color: #fff176; padding: 1px 3px; '
+    'border-radius: 3px;">'
+)
+HL_CLOSE = "</mark>"
+
+# 本文の表示上限（文字数）
+DISPLAY_CHARS = 15000
+
+# FTS の highlight() 結果用：エスケープと一致箇所の目印 → <mark> 置換を
+# 1回の translate で
+_HL_ESC = {
+    **db.HTML_ESCAPE,
+    **str.maketrans({db.HIGHLIGHT_OPEN: HL_OPEN, db.HIGHLIGHT_CLOSE: HL_CLOSE}),
+}
+# 目印とそれ以外の断片に分ける（split は目印を奇数番目に返す）
+_MARK_RE = re.compile(f"([{db.HIGHLIGHT_OPEN}{db.HIGHLIGHT_CLOSE}])")
+
+
+# ── CSV 生成 ──────────────────────────────────────────
+
+@st.cache_data(ttl="5m", max_entries=32, show_spinner=False)
+def _results_csv(key: tuple, _csv_data: pd.DataFrame) -> bytes:
+    """一括ダウンロード用 CSV（BOM 付き UTF-8）。検索条件をキーにキャッシュ"""
+    # Arrow の列をそのまま C 実装の CSV ライタに渡す
+    buf = io.BytesIO()
+    buf.write(codecs.BOM_UTF8)
+    pa_csv.write_csv(pa.Table.from_pandas(_csv_data, preserve_index=False), buf)
+    return buf.getvalue()
+
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def _text_bytes(block_id: int) -> bytes:
+    """個別ダウンロード用のテキスト（UTF-8）。全文はここで初めて id で取得する"""
+    texts = db.get_text_block_texts((block_id,))
+    return "".join(texts["text_content"].fillna("")).encode("utf-8")
+
+
+# ── ダウンロード（全文は押されたときだけ取得） ──────────
+
+@st.fragment
+def _text_download(block_id: int, file_name: str) -> None:
+    """個別ダウンロード。読み込みボタンを押すまで全文は取得しない"""
+    loaded_key = f"text_loaded_{block_id}"
+    if not st.session_state.get(loaded_key):
+        if not st.button("テキストを読み込む", key=f"load_{block_id}"):
+            return
+        st.session_state[loaded_key] = True
+    st.download_button(
+        "テキストをダウンロード",
+        _text_bytes(block_id),
+        file_name=file_name,
+        mime="text/plain",
+        key=f"dl_{block_id}",
+    )
+
+
+@st.fragment
+def _bulk_download(csv_key: tuple, meta: pd.DataFrame) -> None:
+    """一括ダウンロード。作成ボタンを押したときに検索結果の全文を取得する"""
+    if st.session_state.get("text_csv_key") != csv_key:
+        if not st.button("CSV を作成", key="make_csv"):
+            return
+        st.session_state.text_csv_key = csv_key
+
+    texts = db.get_text_block_texts(tuple(int(i) for i in meta["id"]))
+    csv_data = meta.merge(texts, on="id", how="left")[[
+        "sec_code", "filer_name", "period_start", "period_end",
+        "section_label", "text_content",
+    ]].rename(columns={
+        "sec_code": "証券コード",
+        "filer_name": "企業名",
+        "period_start": "期首",
+        "period_end": "期末",
+        "section_label": "セクション",
+        "text_content": "テキスト",
+    })
+    st.download_button(
+        "検索結果を CSV でダウンロード",
+        _results_csv(csv_key, csv_data),
+        file_name="text_blocks_search_result.csv",
+        mime="text/csv",
+        key="bulk_csv",
+    )
+
+
 st.title("テキストブロック閲覧")
 st.markdown("有価証券報告書の「事業の状況」「事業等のリスク」等のテキスト情報を検索・閲覧できます。")
 
@@ -35,13 +126,18 @@ with col1:
     )
 
 with col2:
-    # セクション選択
-    try:
-        sections = db.get_text_block_sections()
-    except Exception:
-        sections = []
-
-    section_options = ["（すべて）"] + sections
+    # セクション選択（一覧はほぼ変わらないので、取得できたらセッションに保持。
+    # 取得に失敗・空のときは保持せず次の再実行で取り直す）
+    if "text_section_options" in st.session_state:
+        section_options = st.session_state.text_section_options
+    else:
+        try:
+            sections = tuple(db.get_text_block_sections())
+        except Exception:
+            sections = ()
+        section_options = ("（すべて）",) + sections
+        if sections:
+            st.session_state.text_section_options = section_options
     selected_section = st.selectbox(
         "セクション",
         section_options,
@@ -68,7 +164,10 @@ if selected_section != "（すべて）":
 if keyword.strip():
     search_params["keyword"] = keyword.strip()
 
-results = db.search_text_blocks(**search_params, limit=limit)
+# Arrow 文字列列の欠損は pd.NA（真偽値にできない）なので先に埋めておく
+results = db.search_text_blocks(
+    **search_params, limit=limit, preview_chars=DISPLAY_CHARS
+).fillna({"section_label": "", "preview": "", "full_len": 0})
 
 # ── 結果表示 ──────────────────────────────────────────
 
@@ -98,54 +197,81 @@ with st.expander("結果一覧（テーブル）", expanded=False):
 
 # ── 各テキストブロックを表示 ──────────────────────────
 
-for idx, (_, block) in enumerate(results.iterrows()):
-    sec = block["sec_code"]
-    name = block["filer_name"]
-    period = block["period_end"]
-    section = block["section_label"] or block["element_name"]
-    content = block["text_content"] or ""
+# ハイライト用の正規表現はループの外で一度だけコンパイル（FTS の highlight()
+# が無いとき用。エスケープ前の本文に当て、実体参照の中で一致しないようにする）
+kw = keyword.strip()
+kw_re = re.compile(f"({re.escape(kw)})", re.IGNORECASE) if kw else None
+
+
+def _highlight(text: str) -> str:
+    """本文をキーワードで分割し、断片ごとにエスケープして一致部分だけ <mark> で囲む"""
+    if not kw_re:
+        return text.translate(db.HTML_ESCAPE)
+    # split はキャプチャした一致部分を奇数番目に返す
+    return "".join(
+        HL_OPEN + part.translate(db.HTML_ESCAPE) + HL_CLOSE if i % 2
+        else part.translate(db.HTML_ESCAPE)
+        for i, part in enumerate(kw_re.split(text))
+    )
+
+
+def _cut_marked(marked: str, limit: int) -> str:
+    """highlight() の結果を目印を数えずに本文 limit 文字で切り、開いた目印を閉じる"""
+    out = []
+    remaining = limit
+    is_open = False
+    for i, part in enumerate(_MARK_RE.split(marked)):
+        if i % 2:
+            is_open = part == db.HIGHLIGHT_OPEN
+            out.append(part)
+            continue
+        if len(part) >= remaining:
+            out.append(part[:remaining])
+            break
+        out.append(part)
+        remaining -= len(part)
+    if is_open:
+        out.append(db.HIGHLIGHT_CLOSE)
+    return "".join(out)
+
+
+for idx, block in enumerate(results.itertuples(index=False)):
+    sec = block.sec_code
+    name = block.filer_name
+    period = block.period_end
+    section = block.section_label or block.element_name
+    content = block.preview
 
     header = f"{sec} {name} | {period} | {section}"
 
     with st.expander(header, expanded=(idx == 0)):
         if content:
-            # キーワードハイライト
-            display_text = content
-            if keyword.strip():
-                # HTML エスケープしてからハイライト
-                escaped_keyword = re.escape(keyword.strip())
-                display_text = re.sub(
-                    f"({escaped_keyword})",
-                    r'<mark style="background-color: #fff176; padding: 1px 3px; '
-                    r'border-radius: 3px;">\1</mark>',
-                    display_text,
-                    flags=re.IGNORECASE,
-                )
+            if block.marked:
+                # FTS で検索できたときは DB が一致箇所に目印を付けた本文を使う
+                # （目印の分だけ長めに返るので、本文の文字数で切り直す）
+                display_text = _cut_marked(content, DISPLAY_CHARS).translate(_HL_ESC)
+            else:
+                # SQLite 側で表示範囲に切ってあるのでエスケープ・キーワードハイライト
+                display_text = _highlight(content)
 
             st.markdown(
                 f'<div style="white-space: pre-wrap; font-size: 0.9em; '
                 f'line-height: 1.7; max-height: 600px; overflow-y: auto; '
                 f'padding: 15px; background: #fafafa; border-radius: 8px; '
                 f'border: 1px solid #e9ecef;">'
-                f'{display_text[:15000]}</div>',
+                f'{display_text}</div>',
                 unsafe_allow_html=True,
             )
 
             # テキスト統計
-            char_count = len(content)
+            char_count = int(block.full_len)
             st.caption(f"文字数: {char_count:,}")
 
-            if char_count > 15000:
-                st.caption("（先頭 15,000 文字を表示）")
+            if char_count > DISPLAY_CHARS:
+                st.caption(f"（先頭 {DISPLAY_CHARS:,} 文字を表示）")
 
             # 個別ダウンロード
-            st.download_button(
-                "テキストをダウンロード",
-                content.encode("utf-8"),
-                file_name=f"{sec}_{period}_{section}.txt",
-                mime="text/plain",
-                key=f"dl_{idx}",
-            )
+            _text_download(int(block.id), f"{sec}_{period}_{section}.txt")
         else:
             st.caption("テキストなし")
 
@@ -156,24 +282,9 @@ st.divider()
 if not results.empty:
     st.markdown("### 一括ダウンロード")
 
-    # CSV 形式
-    csv_data = results[[
-        "sec_code", "filer_name", "period_start", "period_end",
-        "section_label", "text_content",
-    ]].rename(columns={
-        "sec_code": "証券コード",
-        "filer_name": "企業名",
-        "period_start": "期首",
-        "period_end": "期末",
-        "section_label": "セクション",
-        "text_content": "テキスト",
-    })
-
-    csv = csv_data.to_csv(index=False).encode("utf-8-sig")
-    st.download_button(
-        "検索結果を CSV でダウンロード",
-        csv,
-        file_name="text_blocks_search_result.csv",
-        mime="text/csv",
-        key="bulk_csv",
-    )
+    # CSV 形式（全文は作成ボタンを押したときに id で取得）
+    csv_key = (len(results), limit, tuple(sorted(search_params.items())))
+    _bulk_download(csv_key, results[[
+        "id", "sec_code", "filer_name", "period_start", "period_end",
+        "section_label",
+    ]])